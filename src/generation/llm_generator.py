@@ -5,10 +5,43 @@ Neural text generation for context-aware email replies.
 Supports T5, FLAN-T5, and other seq2seq models.
 """
 
-from typing import Dict, Optional, List
+from functools import lru_cache
+from typing import Dict, Optional, List, Tuple
 import re
 
 
+# Fixed instruction header shared by every prompt
+PROMPT_PREFIX = "Generate a professional email reply based on the following:\n\n"
+PROMPT_SUFFIX = "\n\nReply:"
+
+# Maximum encoder input length in tokens
+MAX_INPUT_TOKENS = 512
+
+# Email body budget: tokens fed to the model, characters shown in prompt text
+MAX_BODY_TOKENS = 200
+MAX_BODY_CHARS = 500
+
+# Decode budget cap - email replies are typically 60-120 tokens
+MAX_REPLY_TOKENS = 160
+
+_PROMPT_ARTIFACT_RE = re.compile(r'^(Reply:|Response:|Email:)\s*', re.IGNORECASE)
+_MULTI_NL_RE = re.compile(r'\n{3,}')
+
+
+@lru_cache(maxsize=1024)
+def _fallback_cached(intent: str, sender_name: str, subject: str, user_name: str) -> str:
+    """Render the fallback reply for an intent (memoized per sender/subject)."""
+    if intent == "academic":
+        return f"Dear {sender_name},\n\nThank you for your email regarding {subject}. I have received your message and will respond with the requested information shortly.\n\nBest regards,\n{user_name}"
+    if intent == "internship":
+        return f"Hello {sender_name},\n\nThank you for reaching out. I appreciate the opportunity and will respond with the requested information shortly.\n\nKind regards,\n{user_name}"
+    if intent == "meeting":
+        return f"Hello {sender_name},\n\nThank you for your message. I would be happy to meet. Please let me know what times work best for you.\n\nBest,\n{user_name}"
+    if intent == "support":
+        return f"Hello,\n\nThank you for reaching out. I have received your request and will get back to you within 24 hours.\n\nBest regards,\n{user_name}"
+    return f"Hello {sender_name},\n\nThank you for your email. I have received your message and will respond shortly.\n\nBest regards,\n{user_name}"
+
+
 class LLMGenerator:
     """
     Generate email responses using LLM (T5/FLAN-T5/Mistral).
@@ -21,7 +54,10 @@ class LLMGenerator:
         self,
         model_path: Optional[str] = None,
         model_type: str = "t5-base",
-        device: str = "cpu"
+        device: str = "cpu",
+        quantization: Optional[str] = "int8",
+        backend: str = "pytorch",
+        compile_model: bool = False
     ):
         """
         Initialize LLM generator.
@@ -30,18 +66,26 @@ class LLMGenerator:
             model_path: Path to fine-tuned model
             model_type: Model architecture (t5-base, flan-t5-base, etc.)
             device: Device for inference (cpu/cuda)
+            quantization: Weight quantization ("int8" or None for full FP32)
+            backend: Inference backend (pytorch/onnx)
+            compile_model: Compile the PyTorch model with torch.compile (opt-in;
+                compiling takes far longer than a single generate call)
         """
         self.model_path = model_path
         self.model_type = model_type
         self.device = device
+        self.quantization = quantization
+        self.backend = backend
+        self.compile_model = compile_model
         self.model = None
         self.tokenizer = None
+        self._prefix_ids = None
         
         # Generation parameters
         self.max_length = 300
         self.temperature = 0.7
         self.top_p = 0.9
-        self.num_beams = 4
+        self.num_beams = 1
         
         # Load model if path provided
         if model_path:
@@ -72,36 +116,111 @@ class LLMGenerator:
         Returns:
             Generation result with draft text
         """
-        # Build prompt
-        prompt = self._build_prompt(
-            email=email,
-            intent=intent,
-            urgency=urgency,
-            sentiment=sentiment,
-            context=context,
+        return self.generate_batch(
+            emails=[email],
+            intents=[intent],
+            urgencies=[urgency],
+            sentiments=[sentiment],
+            contexts=[context],
             user_name=user_name
-        )
+        )[0]
+    
+    def generate_batch(
+        self,
+        emails: List[Dict[str, str]],
+        intents: List[str],
+        urgencies: Optional[List[str]] = None,
+        sentiments: Optional[List[str]] = None,
+        contexts: Optional[List[Optional[str]]] = None,
+        user_name: str = "Rayan"
+    ) -> List[Dict[str, any]]:
+        """
+        Generate responses for several emails in a single model call.
+        
+        Args:
+            emails: Email dictionaries
+            intents: Classified intent per email
+            urgencies: Urgency level per email (default: medium)
+            sentiments: Sentiment per email (default: neutral)
+            contexts: RAG context per email (optional)
+            user_name: User's name for signature
+            
+        Returns:
+            Generation result per email, in input order
+            
+        Raises:
+            ValueError: If a per-email list does not match the number of emails
+        """
+        count = len(emails)
+        urgencies = urgencies or ["medium"] * count
+        sentiments = sentiments or ["neutral"] * count
+        contexts = contexts or [None] * count
+        
+        # zip() would silently drop emails or pair them with the wrong labels
+        for name, values in (
+            ("intents", intents),
+            ("urgencies", urgencies),
+            ("sentiments", sentiments),
+            ("contexts", contexts),
+        ):
+            if len(values) != count:
+                raise ValueError(f"Expected {count} {name}, got {len(values)}")
         
         # Generate with model
         if self.model is not None:
-            draft = self._generate_with_model(prompt)
+            # Build prompts
+            segments = [
+                self._build_prompt_segments(
+                    email, intent, urgency, sentiment, context, user_name
+                )
+                for email, intent, urgency, sentiment, context
+                in zip(emails, intents, urgencies, sentiments, contexts)
+            ]
+            drafts = self._generate_with_model(segments)
+            previews = [self._prompt_preview(*segment) for segment in segments]
         else:
-            # Fallback to rule-based generation
-            draft = self._generate_fallback(email, intent, user_name)
-        
-        # Post-process
-        draft = self._post_process(draft, user_name)
-        
-        return {
-            "draft": draft,
-            "method": "llm" if self.model else "llm_fallback",
-            "confidence": 0.80 if self.model else 0.65,
-            "model_type": self.model_type,
-            "word_count": len(draft.split()),
-            "prompt_used": prompt[:100] + "..." if len(prompt) > 100 else prompt
-        }
+            # Fallback to rule-based generation (no prompt needed)
+            drafts = [
+                self._generate_fallback(email, intent, user_name)
+                for email, intent in zip(emails, intents)
+            ]
+            previews = [""] * count
+        
+        results = []
+        for draft, preview in zip(drafts, previews):
+            # Post-process
+            draft = self._post_process(draft, user_name)
+            
+            results.append({
+                "draft": draft,
+                "method": "llm" if self.model else "llm_fallback",
+                "confidence": 0.80 if self.model else 0.65,
+                "model_type": self.model_type,
+                "word_count": len(draft.split()),
+                "prompt_used": preview
+            })
+        
+        return results
+    
+    def _prompt_preview(self, head: str, body: str, tail: str) -> str:
+        """
+        First 100 characters of the prompt, without building the full prompt.
+        
+        Args:
+            head: Prompt head
+            body: Email body
+            tail: Prompt tail
+            
+        Returns:
+            Prompt preview
+        """
+        if len(head) > 100:
+            return f"{head[:100]}..."
+        
+        prompt = head + body[:MAX_BODY_CHARS] + tail
+        return f"{prompt[:100]}..." if len(prompt) > 100 else prompt
     
-    def _build_prompt(
+    def _build_prompt_segments(
         self,
         email: Dict[str, str],
         intent: str,
@@ -109,9 +228,12 @@ class LLMGenerator:
         sentiment: str,
         context: Optional[str],
         user_name: str
-    ) -> str:
+    ) -> Tuple[str, str, str]:
         """
-        Build prompt for LLM.
+        Build prompt as (head, body, tail) segments.
+        
+        The email body is kept separate and untruncated so it can be
+        truncated once, in tokens, at tokenization time.
         
         Args:
             email: Email dictionary
@@ -122,76 +244,124 @@ class LLMGenerator:
             user_name: User name
             
         Returns:
-            Formatted prompt
+            Prompt head (instruction + metadata), email body, prompt tail
         """
         # Instruction-based prompt for FLAN-T5 style models
-        prompt = f"""Generate a professional email reply based on the following:
-
-Intent: {intent}
+        head = PROMPT_PREFIX + f"""Intent: {intent}
 Urgency: {urgency}
 Sentiment: {sentiment}
 
 Original Email:
 Subject: {email.get('subject', '')}
 From: {email.get('sender', '')}
-Body: {email.get('body', '')[:500]}
-
-"""
+Body: """
+        
+        tail = "\n\n"
         
         # Add RAG context if available
         if context:
-            prompt += f"""Relevant Context:
+            tail += f"""Relevant Context:
 {context}
 
 """
         
-        prompt += f"""Generate a {intent} reply from {user_name} that is:
+        tail += f"""Generate a {intent} reply from {user_name} that is:
 - Professional and appropriate for the {urgency} urgency level
 - Responsive to the sender's {sentiment} tone
-- Clear and concise
-
-Reply:"""
+- Clear and concise"""
         
-        return prompt
+        return head, email.get('body', ''), tail + PROMPT_SUFFIX
     
-    def _generate_with_model(self, prompt: str) -> str:
+    def _generate_with_model(self, segments: List[Tuple[str, str, str]]) -> List[str]:
         """
         Generate using loaded model.
         
         Args:
-            prompt: Input prompt
+            segments: Prompt (head, body, tail) segments, generated as one padded batch
             
         Returns:
-            Generated text
+            Generated text per prompt
         """
         try:
             # Tokenize
-            inputs = self.tokenizer(
-                prompt,
-                return_tensors="pt",
-                max_length=512,
-                truncation=True
-            ).to(self.device)
+            inputs = self._tokenize(segments)
+            
+            # Beam search and sampling are mutually exclusive
+            if self.num_beams > 1:
+                decoding = {"num_beams": self.num_beams, "early_stopping": True}
+            else:
+                decoding = {
+                    "do_sample": True,
+                    "temperature": self.temperature,
+                    "top_p": self.top_p,
+                }
             
             # Generate
             outputs = self.model.generate(
                 **inputs,
-                max_length=self.max_length,
-                temperature=self.temperature,
-                top_p=self.top_p,
-                num_beams=self.num_beams,
-                do_sample=True,
-                early_stopping=True
+                max_new_tokens=min(self.max_length, MAX_REPLY_TOKENS),
+                **decoding
             )
             
             # Decode
-            generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            return generated_text
+            return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
         
         except Exception as e:
             print(f"Generation error: {e}")
-            return self._generate_fallback({}, "general", "User")
+            return [self._generate_fallback({}, "general", "User")] * len(segments)
+    
+    def _tokenize(self, segments: List[Tuple[str, str, str]]) -> Dict[str, any]:
+        """
+        Tokenize prompt segments, reusing cached token ids for the fixed
+        instruction header and truncating the email body in tokens.
+        
+        Args:
+            segments: (head, body, tail) per prompt
+            
+        Returns:
+            Right-padded model inputs on the target device
+        """
+        import torch
+        
+        if self._prefix_ids is None:
+            self._prefix_ids = self.tokenizer(
+                PROMPT_PREFIX, add_special_tokens=False
+            )["input_ids"]
+        
+        sequences = []
+        for head, body, tail in segments:
+            # Only the per-email parts of the prompt are tokenized on each call
+            head_ids = self.tokenizer(
+                head[len(PROMPT_PREFIX):], add_special_tokens=False
+            )["input_ids"]
+            body_ids = self.tokenizer(
+                body,
+                max_length=MAX_BODY_TOKENS,
+                truncation=True,
+                add_special_tokens=False
+            )["input_ids"]
+            tail_ids = self.tokenizer(tail)["input_ids"]
+            
+            ids = self._prefix_ids + head_ids + body_ids + tail_ids
+            if len(ids) > MAX_INPUT_TOKENS:
+                # Keep the end-of-sequence token
+                ids = ids[:MAX_INPUT_TOKENS - 1] + ids[-1:]
+            
+            sequences.append(ids)
+        
+        width = max(len(ids) for ids in sequences)
+        pad_id = self.tokenizer.pad_token_id
+        
+        input_ids = torch.tensor(
+            [ids + [pad_id] * (width - len(ids)) for ids in sequences],
+            device=self.device
+        )
+        attention_mask = torch.tensor(
+            [[1] * len(ids) + [0] * (width - len(ids)) for ids in sequences],
+            device=self.device
+        )
+        
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
     
     def _generate_fallback(self, email: Dict[str, str], intent: str, user_name: str) -> str:
         """
@@ -209,15 +379,7 @@ Reply:"""
         sender_name = sender.split('@')[0].replace('.', ' ').title() if sender else "there"
         subject = email.get("subject", "your message")
         
-        templates = {
-            "academic": f"Dear {sender_name},\n\nThank you for your email regarding {subject}. I have received your message and will respond with the requested information shortly.\n\nBest regards,\n{user_name}",
-            "internship": f"Hello {sender_name},\n\nThank you for reaching out. I appreciate the opportunity and will respond with the requested information shortly.\n\nKind regards,\n{user_name}",
-            "meeting": f"Hello {sender_name},\n\nThank you for your message. I would be happy to meet. Please let me know what times work best for you.\n\nBest,\n{user_name}",
-            "support": f"Hello,\n\nThank you for reaching out. I have received your request and will get back to you within 24 hours.\n\nBest regards,\n{user_name}",
-            "general": f"Hello {sender_name},\n\nThank you for your email. I have received your message and will respond shortly.\n\nBest regards,\n{user_name}"
-        }
-        
-        return templates.get(intent, templates["general"])
+        return _fallback_cached(intent, sender_name, subject, user_name)
     
     def _post_process(self, text: str, user_name: str) -> str:
         """
@@ -231,10 +393,10 @@ Reply:"""
             Cleaned text
         """
         # Remove any prompt artifacts
-        text = re.sub(r'^(Reply:|Response:|Email:)\s*', '', text, flags=re.IGNORECASE)
+        text = _PROMPT_ARTIFACT_RE.sub('', text)
         
         # Ensure proper spacing
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        text = _MULTI_NL_RE.sub('\n\n', text)
         
         # Ensure signature if missing
         if user_name not in text:
@@ -255,9 +417,34 @@ Reply:"""
             from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
             
             self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-            self.model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
-            self.model.to(self.device)
-            self.model.eval()
+            
+            if self.backend == "onnx":
+                self.model = self._load_onnx_model(model_path)
+            elif self.quantization == "int8" and self.device.startswith("cuda"):
+                # bitsandbytes INT8 weights, placed on GPU by accelerate
+                self.model = AutoModelForSeq2SeqLM.from_pretrained(
+                    model_path,
+                    load_in_8bit=True,
+                    device_map="auto"
+                )
+                self.model.eval()
+            else:
+                self.model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+                self.model.to(self.device)
+                
+                if self.quantization == "int8":
+                    # Dynamic INT8 quantization of the Linear layers (CPU only)
+                    import torch
+                    self.model = torch.quantization.quantize_dynamic(
+                        self.model,
+                        {torch.nn.Linear},
+                        dtype=torch.qint8
+                    )
+                
+                self.model.eval()
+                
+                if self.compile_model:
+                    self._compile_model()
             
             print(f"Loaded LLM model from {model_path}")
         except Exception as e:
@@ -266,12 +453,81 @@ Reply:"""
             self.model = None
             self.tokenizer = None
     
+    def _compile_model(self):
+        """
+        Compile model forward pass with torch.compile and warm it up.
+        
+        Falls back to the eager model if compilation or warm-up fails.
+        """
+        import torch
+        
+        if not hasattr(torch, "compile"):
+            return
+        
+        eager_forward = self.model.forward
+        cache_implementation = self.model.generation_config.cache_implementation
+        
+        try:
+            # Static KV cache gives the compiler fixed shapes across decode steps
+            self.model.generation_config.cache_implementation = "static"
+            
+            # CUDA graphs ("reduce-overhead") only help on GPU
+            mode = "reduce-overhead" if self.device.startswith("cuda") else "default"
+            self.model.forward = torch.compile(
+                eager_forward,
+                mode=mode,
+                fullgraph=False
+            )
+            
+            # First call triggers Inductor compilation (cached under
+            # TORCHINDUCTOR_CACHE_DIR), so pay for it at load time
+            inputs = self.tokenizer("Reply:", return_tensors="pt").to(self.device)
+            with torch.no_grad():
+                self.model.generate(
+                    **inputs,
+                    max_new_tokens=min(self.max_length, MAX_REPLY_TOKENS)
+                )
+        except Exception as e:
+            print(f"torch.compile failed, using eager model: {e}")
+            self.model.forward = eager_forward
+            self.model.generation_config.cache_implementation = cache_implementation
+    
+    def _load_onnx_model(self, model_path: str):
+        """
+        Export model to ONNX Runtime (encoder + decoder with past).
+        
+        Args:
+            model_path: Path to model checkpoint
+            
+        Returns:
+            ORT seq2seq model exposing the same generate() API
+        """
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        
+        on_gpu = self.device.startswith("cuda")
+        
+        # IO binding keeps inputs/outputs and past key values on device
+        # between decoder steps instead of copying them back to host
+        return ORTModelForSeq2SeqLM.from_pretrained(
+            model_path,
+            export=True,
+            use_cache=True,
+            provider="CUDAExecutionProvider" if on_gpu else "CPUExecutionProvider",
+            session_options=session_options,
+            use_io_binding=on_gpu
+        )
+    
     def set_generation_params(
         self,
         max_length: int = 300,
         temperature: float = 0.7,
         top_p: float = 0.9,
-        num_beams: int = 4
+        num_beams: int = 1
     ):
         """
         Update generation parameters.
@@ -280,7 +536,7 @@ Reply:"""
             max_length: Maximum output length
             temperature: Sampling temperature
             top_p: Nucleus sampling parameter
-            num_beams: Number of beams for beam search
+            num_beams: Number of beams for beam search (1 = sampling)
         """
         self.max_length = max_length
         self.temperature = temperature
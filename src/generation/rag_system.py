@@ -9,6 +9,114 @@ from typing import Dict, List, Optional, Tuple
 import json
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Cache directory for INT8-quantized embedding models
+INT8_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rag_int8")
+
+# Index selection thresholds (number of documents)
+HNSW_MIN_DOCUMENTS = 1000
+IVFPQ_MIN_DOCUMENTS = 100000
+
+# Parsed corpus + embeddings cache, kept inside the knowledge base directory
+KB_CACHE_DIRNAME = ".rag_cache"
+
+
+def _json_loads(data: bytes):
+    """Parse JSON bytes with orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class QuantizedEncoder:
+    """
+    INT8 ONNX Runtime sentence encoder.
+    
+    Drop-in replacement for the subset of SentenceTransformer.encode
+    used by RAGSystem (mean pooling + optional L2 normalization).
+    """
+    
+    def __init__(self, model_name: str, cache_dir: str = INT8_CACHE_DIR):
+        """
+        Export, quantize (once) and load the encoder.
+        
+        Args:
+            model_name: Sentence transformer model name
+            cache_dir: Directory holding quantized models
+        """
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+        
+        model_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        save_dir = os.path.join(cache_dir, model_id.replace("/", "__"))
+        
+        if not os.path.exists(os.path.join(save_dir, "model_quantized.onnx")):
+            model = ORTModelForFeatureExtraction.from_pretrained(
+                model_id,
+                export=True,
+                provider="CPUExecutionProvider"
+            )
+            quantizer = ORTQuantizer.from_pretrained(model)
+            config = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=True)
+            quantizer.quantize(save_dir=save_dir, quantization_config=config)
+            AutoTokenizer.from_pretrained(model_id).save_pretrained(save_dir)
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(save_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            save_dir,
+            file_name="model_quantized.onnx",
+            provider="CPUExecutionProvider"
+        )
+    
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        **kwargs
+    ):
+        """
+        Encode texts to sentence embeddings.
+        
+        Args:
+            texts: Input texts
+            batch_size: Texts per forward pass
+            normalize_embeddings: L2-normalize each embedding
+            **kwargs: Ignored (SentenceTransformer compatibility)
+            
+        Returns:
+            Embedding array (one row per text)
+        """
+        import numpy as np
+        
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=256,
+                return_tensors="np"
+            )
+            hidden = self.model(**inputs).last_hidden_state
+            
+            # Mean pooling over non-padding tokens
+            mask = inputs["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            
+            batches.append(pooled)
+        
+        return np.concatenate(batches)
+
 
 class RAGSystem:
     """
@@ -22,7 +130,9 @@ class RAGSystem:
         self,
         knowledge_base_path: Optional[str] = None,
         embedding_model: str = "all-MiniLM-L6-v2",
-        top_k: int = 3
+        top_k: int = 3,
+        quantize: bool = True,
+        device: str = "cpu"
     ):
         """
         Initialize RAG system.
@@ -31,14 +141,30 @@ class RAGSystem:
             knowledge_base_path: Path to knowledge base directory
             embedding_model: Sentence transformer model name
             top_k: Number of documents to retrieve
+            quantize: Use an INT8 ONNX Runtime encoder when available
+            device: Device for FAISS search (cpu/cuda)
         """
         self.knowledge_base_path = knowledge_base_path
         self.embedding_model_name = embedding_model
         self.top_k = top_k
+        self.quantize = quantize
+        self.device = device
+        self._gpu_resources = None
         
         self.index = None
-        self.documents = []
+        
+        # Documents stored as parallel arrays (one entry per document)
+        self._contents = []
+        self._intents = []
+        self._metadata = []
+        
+        # Per-intent sub-indices and their global document ids
+        self._intent_ids = {}
+        self._per_intent_index = {}
+        
+        # Encoder is loaded on first use (only needed once there is a corpus)
         self.embeddings_model = None
+        self._embeddings_model_loaded = False
         
         # Load knowledge base if path provided
         if knowledge_base_path and os.path.exists(knowledge_base_path):
@@ -59,42 +185,71 @@ class RAGSystem:
             top_k: Number of documents to retrieve (overrides default)
             
         Returns:
-            List of retrieved documents with scores
+            List of retrieved documents with similarity scores
+        """
+        return self.retrieve_batch([query], intent=intent, top_k=top_k)[0]
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        intent: Optional[str] = None,
+        top_k: Optional[int] = None
+    ) -> List[List[Dict[str, any]]]:
+        """
+        Retrieve relevant documents for several queries at once.
+        
+        Args:
+            queries: Query texts (email content)
+            intent: Optional intent filter
+            top_k: Number of documents to retrieve per query (overrides default)
+            
+        Returns:
+            List of retrieved documents with similarity scores
+            (higher is more relevant), one list per query
         """
-        if not self.index or not self.documents:
-            return []
+        if not self.index or not self._contents:
+            return [[] for _ in queries]
         
         k = top_k or self.top_k
         
+        # Intent-filtered queries search only that intent's sub-index
+        if intent and intent not in self._per_intent_index:
+            return [[] for _ in queries]
+        
         try:
-            # Encode query
-            query_embedding = self._encode(query)
+            import numpy as np
+            
+            # Encode all queries in one pass
+            query_embeddings = self._encode(queries)
             
             # Search index
-            distances, indices = self.index.search(query_embedding, k)
+            if intent:
+                ids = self._intent_ids[intent]
+                scores, local_indices = self._per_intent_index[intent].search(query_embeddings, k)
+                indices = np.where(local_indices >= 0, ids[local_indices], -1)
+            else:
+                scores, indices = self.index.search(query_embeddings, k)
             
-            # Get documents
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self.documents):
-                    doc = self.documents[idx]
-                    
-                    # Filter by intent if specified
-                    if intent and doc.get("intent") != intent:
-                        continue
-                    
-                    results.append({
-                        "content": doc.get("content", ""),
-                        "metadata": doc.get("metadata", {}),
-                        "score": float(distances[0][i]),
-                        "intent": doc.get("intent", ""),
-                    })
+            batch_results = []
+            for row_scores, row_indices in zip(scores, indices):
+                # Get documents
+                results = []
+                for score, idx in zip(row_scores, row_indices):
+                    if 0 <= idx < len(self._contents):
+                        results.append({
+                            "content": self._contents[idx],
+                            "metadata": self._metadata[idx],
+                            "score": float(score),
+                            "intent": self._intents[idx],
+                        })
+                
+                batch_results.append(results)
             
-            return results
+            return batch_results
         
         except Exception as e:
             print(f"Retrieval error: {e}")
-            return []
+            return [[] for _ in queries]
     
     def augment_prompt(
         self,
@@ -143,68 +298,210 @@ class RAGSystem:
             intent: Associated intent
             metadata: Additional metadata
         """
-        doc = {
-            "content": content,
-            "intent": intent,
-            "metadata": metadata or {}
-        }
-        
-        self.documents.append(doc)
+        self._append_document(content, intent, metadata or {})
         
-        # Re-index if index exists
+        # Index only the new document if index exists
         if self.index is not None:
-            self._rebuild_index()
+            import faiss
+            import numpy as np
+            
+            embedding = self._encode([content])
+            self.index.add(embedding)
+            
+            doc_id = np.array([len(self._contents) - 1], dtype='int64')
+            if intent in self._per_intent_index:
+                self._intent_ids[intent] = np.concatenate([self._intent_ids[intent], doc_id])
+            else:
+                self._intent_ids[intent] = doc_id
+                self._per_intent_index[intent] = self._create_index(faiss, embedding)
+            self._per_intent_index[intent].add(embedding)
+    
+    @property
+    def documents(self) -> List[Dict[str, any]]:
+        """Documents as dictionaries (built on access)."""
+        return [
+            {"content": content, "intent": intent, "metadata": metadata}
+            for content, intent, metadata
+            in zip(self._contents, self._intents, self._metadata)
+        ]
+    
+    def _append_document(self, content: str, intent: str, metadata: Dict):
+        """Append one document to the parallel arrays."""
+        self._contents.append(content)
+        self._intents.append(intent)
+        self._metadata.append(metadata)
     
     def _load_knowledge_base(self, path: str):
         """
         Load knowledge base from directory.
         
+        Reuses the cached corpus and embeddings when the source JSON
+        files are unchanged, so no encoding happens on startup.
+        
         Args:
             path: Path to knowledge base directory
         """
         try:
+            sources = self._knowledge_base_signature(path)
+            
+            embeddings = self._load_cache(path, sources)
+            if embeddings is not None:
+                print(f"Loaded {len(self._contents)} documents from knowledge base cache")
+                self._build_index(embeddings)
+                return
+            
             # Load documents from JSON files
-            for filename in os.listdir(path):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(path, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        
-                        if isinstance(data, list):
-                            self.documents.extend(data)
-                        elif isinstance(data, dict):
-                            self.documents.append(data)
-            
-            print(f"Loaded {len(self.documents)} documents from knowledge base")
+            for filename, _, _ in sources["files"]:
+                filepath = os.path.join(path, filename)
+                with open(filepath, 'rb') as f:
+                    data = _json_loads(f.read())
+                    
+                    if isinstance(data, dict):
+                        data = [data]
+                    
+                    if isinstance(data, list):
+                        for doc in data:
+                            self._append_document(
+                                doc.get("content", ""),
+                                doc.get("intent", ""),
+                                doc.get("metadata", {})
+                            )
+            
+            print(f"Loaded {len(self._contents)} documents from knowledge base")
             
             # Build index
-            if self.documents:
-                self._build_index()
+            if self._contents:
+                embeddings = self._build_index()
+                
+                if embeddings is not None:
+                    self._save_cache(path, sources, embeddings)
         
         except Exception as e:
             print(f"Failed to load knowledge base: {e}")
     
-    def _build_index(self):
-        """Build FAISS index from documents."""
+    def _knowledge_base_signature(self, path: str) -> Dict[str, any]:
+        """
+        Describe the knowledge base sources for cache validation.
+        
+        Args:
+            path: Path to knowledge base directory
+            
+        Returns:
+            Embedding model name, encoder kind, cached embedding dtype and
+            (filename, mtime, size) per JSON file
+        """
+        self._ensure_embeddings_model()
+        
+        files = []
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith('.json'):
+                stat = os.stat(os.path.join(path, filename))
+                files.append([filename, stat.st_mtime_ns, stat.st_size])
+        
+        # INT8 and FP32 encoders produce different vectors for the same model
+        return {
+            "model": self.embedding_model_name,
+            "quantize": self.quantize,
+            "encoder": type(self.embeddings_model).__name__,
+            "dtype": "float32",
+            "files": files,
+        }
+    
+    def _load_cache(self, path: str, sources: Dict[str, any]):
+        """
+        Load cached documents and embeddings if they match the sources.
+        
+        Args:
+            path: Path to knowledge base directory
+            sources: Current knowledge base signature
+            
+        Returns:
+            Memory-mapped embeddings, or None if the cache is missing or stale
+        """
+        cache_dir = os.path.join(path, KB_CACHE_DIRNAME)
+        documents_path = os.path.join(cache_dir, "documents.jsonl")
+        embeddings_path = os.path.join(cache_dir, "embeddings.npy")
+        
+        if not (os.path.exists(documents_path) and os.path.exists(embeddings_path)):
+            return None
+        
+        try:
+            import numpy as np
+            
+            with open(documents_path, 'rb') as f:
+                # First line holds the signature the cache was built from
+                if _json_loads(f.readline()) != sources:
+                    return None
+                
+                for line in f:
+                    doc = _json_loads(line)
+                    self._append_document(doc["content"], doc["intent"], doc["metadata"])
+            
+            return np.load(embeddings_path, mmap_mode='r')
+        
+        except Exception as e:
+            print(f"Ignoring knowledge base cache: {e}")
+            self._contents, self._intents, self._metadata = [], [], []
+            return None
+    
+    def _save_cache(self, path: str, sources: Dict[str, any], embeddings):
+        """
+        Save parsed documents and embeddings next to the knowledge base.
+        
+        Args:
+            path: Path to knowledge base directory
+            sources: Knowledge base signature the cache is built from
+            embeddings: Document embeddings the index was built from
+        """
+        try:
+            import numpy as np
+            
+            cache_dir = os.path.join(path, KB_CACHE_DIRNAME)
+            os.makedirs(cache_dir, exist_ok=True)
+            
+            # FP32 as indexed, so a warm start maps the file without converting it
+            np.save(os.path.join(cache_dir, "embeddings.npy"), embeddings)
+            
+            with open(os.path.join(cache_dir, "documents.jsonl"), 'w', encoding='utf-8') as f:
+                f.write(json.dumps(sources) + "\n")
+                for doc in self.documents:
+                    f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+        
+        except Exception as e:
+            print(f"Failed to save knowledge base cache: {e}")
+    
+    def _build_index(self, embeddings=None):
+        """
+        Build FAISS index from documents.
+        
+        Args:
+            embeddings: Precomputed document embeddings (encoded if omitted)
+            
+        Returns:
+            Indexed embeddings, or None if the index could not be built
+        """
         try:
             import faiss
-            from sentence_transformers import SentenceTransformer
             import numpy as np
             
             # Load embedding model
-            if self.embeddings_model is None:
+            if self._ensure_embeddings_model() is None:
+                from sentence_transformers import SentenceTransformer
                 self.embeddings_model = SentenceTransformer(self.embedding_model_name)
             
             # Encode all documents
-            contents = [doc.get("content", "") for doc in self.documents]
-            embeddings = self.embeddings_model.encode(contents, show_progress_bar=False)
+            if embeddings is None:
+                embeddings = self._encode(self._contents)
+            else:
+                embeddings = np.ascontiguousarray(embeddings, dtype='float32')
             
             # Create FAISS index
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(np.array(embeddings).astype('float32'))
+            self.index = self._create_index(faiss, embeddings)
+            self.index.add(embeddings)
+            self._index_intents(faiss, embeddings)
             
-            print(f"Built FAISS index with {len(self.documents)} documents")
+            print(f"Built FAISS index with {len(self._contents)} documents")
+            return embeddings
         
         except ImportError:
             print("FAISS or sentence-transformers not installed. RAG disabled.")
@@ -212,29 +509,165 @@ class RAGSystem:
         except Exception as e:
             print(f"Failed to build index: {e}")
     
-    def _rebuild_index(self):
-        """Rebuild index after adding documents."""
-        self.index = None
-        self._build_index()
+    def _create_index(self, faiss, embeddings):
+        """
+        Create an inner-product index sized for the knowledge base.
+        
+        Embeddings are L2-normalized, so inner product is cosine similarity.
+        Small bases use an exact scan, medium ones an HNSW graph (both
+        storing vectors in FP16) and large ones IVF-PQ. On GPU, the exact
+        scan (cuBLAS) replaces HNSW, which has no GPU implementation.
+        
+        Args:
+            faiss: FAISS module
+            embeddings: Document embeddings (used to train IVF-PQ)
+            
+        Returns:
+            Empty (trained) FAISS index
+        """
+        count, dimension = embeddings.shape
+        
+        if count > IVFPQ_MIN_DOCUMENTS:
+            quantizer = faiss.IndexFlatIP(dimension)
+            index = faiss.IndexIVFPQ(
+                quantizer, dimension, 256, 16, 8, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(embeddings)
+            index.nprobe = 16
+            return self._to_gpu(faiss, index) if self._use_gpu(faiss) else index
+        
+        if self._use_gpu(faiss):
+            return self._to_gpu(faiss, faiss.IndexFlatIP(dimension))
+        
+        if count > HNSW_MIN_DOCUMENTS:
+            index = faiss.IndexHNSWSQ(
+                dimension, faiss.ScalarQuantizer.QT_fp16, 32, faiss.METRIC_INNER_PRODUCT
+            )
+            index.hnsw.efConstruction = 200
+            index.hnsw.efSearch = 64
+        else:
+            index = faiss.IndexScalarQuantizer(
+                dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            )
+        
+        # FP16 storage needs no real training, but faiss requires the call
+        if not index.is_trained:
+            index.train(embeddings)
+        
+        return index
+    
+    def _use_gpu(self, faiss) -> bool:
+        """Check whether FAISS indices should live on the GPU."""
+        return (
+            self.device.startswith("cuda")
+            and hasattr(faiss, "StandardGpuResources")
+            and faiss.get_num_gpus() > 0
+        )
     
-    def _encode(self, text: str):
+    def _to_gpu(self, faiss, index):
         """
-        Encode text to embedding.
+        Move index to the GPU, storing vectors in FP16.
         
         Args:
-            text: Input text
+            faiss: FAISS module
+            index: CPU index (trained)
             
         Returns:
-            Embedding array
+            GPU index
+        """
+        if self._gpu_resources is None:
+            self._gpu_resources = faiss.StandardGpuResources()
+        
+        options = faiss.GpuClonerOptions()
+        options.useFloat16 = True
+        
+        return faiss.index_cpu_to_gpu(self._gpu_resources, 0, index, options)
+    
+    def _index_intents(self, faiss, embeddings):
+        """
+        Build one sub-index per intent over that intent's documents.
+        
+        Args:
+            faiss: FAISS module
+            embeddings: Embeddings of all documents
         """
         import numpy as np
         
-        if self.embeddings_model is None:
+        buckets = {}
+        for doc_id, intent in enumerate(self._intents):
+            buckets.setdefault(intent, []).append(doc_id)
+        
+        self._intent_ids = {}
+        self._per_intent_index = {}
+        
+        for intent, doc_ids in buckets.items():
+            ids = np.array(doc_ids, dtype='int64')
+            subset = embeddings[ids]
+            
+            index = self._create_index(faiss, subset)
+            index.add(subset)
+            
+            self._intent_ids[intent] = ids
+            self._per_intent_index[intent] = index
+    
+    def _ensure_embeddings_model(self):
+        """
+        Load the sentence encoder on first use, once.
+        
+        Returns:
+            Embedding model or None
+        """
+        if not self._embeddings_model_loaded:
+            self.embeddings_model = self._load_embeddings_model()
+            self._embeddings_model_loaded = True
+        
+        return self.embeddings_model
+    
+    def _load_embeddings_model(self):
+        """
+        Load sentence encoder once, if installed.
+        
+        Prefers the INT8 ONNX Runtime encoder, falling back to the
+        FP32 SentenceTransformer.
+        
+        Returns:
+            Embedding model or None
+        """
+        if self.quantize:
+            try:
+                return QuantizedEncoder(self.embedding_model_name)
+            except ImportError:
+                pass
+            except Exception as e:
+                print(f"Failed to load INT8 embedding model: {e}")
+        
+        try:
             from sentence_transformers import SentenceTransformer
-            self.embeddings_model = SentenceTransformer(self.embedding_model_name)
+            return SentenceTransformer(self.embedding_model_name)
+        except ImportError:
+            return None
+        except Exception as e:
+            print(f"Failed to load embedding model: {e}")
+            return None
+    
+    def _encode(self, texts: List[str]):
+        """
+        Encode texts to normalized embeddings.
         
-        embedding = self.embeddings_model.encode([text], show_progress_bar=False)
-        return np.array(embedding).astype('float32')
+        Args:
+            texts: Input texts
+            
+        Returns:
+            Embedding array (one row per text)
+        """
+        embeddings = self.embeddings_model.encode(
+            texts,
+            batch_size=32,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return embeddings.astype('float32')
     
     def save_knowledge_base(self, path: str):
         """
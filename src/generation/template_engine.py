@@ -1,83 +1,103 @@
 """
 Template Engine
 
-Rule-based response generation using Jinja2 templates.
+Rule-based response generation using templates.
+Built-in templates are plain Python; custom templates use Jinja2.
 Provides fast, consistent responses for common scenarios.
 """
 
+import re
 from typing import Dict, Optional
-from jinja2 import Template
 
 
-class TemplateEngine:
-    """Generate email responses using templates."""
-    
-    def __init__(self):
-        # Define templates for each intent
-        self.templates = {
-            "academic": Template("""Dear {{ sender_name }},
+# A date: month name and day ("March 15", "Jan. 3rd") or numeric ("15/03")
+_DATE = (
+    r'(?:(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?'
+    r'|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)'
+    r'\.?\s+\d{1,2}(?:st|nd|rd|th)?'
+    r'|\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?)\b'
+)
 
-Thank you for your email regarding {{ subject }}.
+# Deadline mentions, matched as lookaheads so overlapping mentions are all
+# seen in a single scan; group names listed in order of precedence
+_DEADLINE_RE = re.compile(
+    rf'(?=\bdeadline\s+(?:is\s+)?(?:on\s+)?(?P<deadline>{_DATE})'
+    rf'|\bdue\s+(?:on\s+)?(?P<due>{_DATE})'
+    rf'|\bby\s+(?P<by>{_DATE}))',
+    re.IGNORECASE
+)
+_DEADLINE_PRECEDENCE = ("deadline", "due", "by")
 
-{% if urgency == "critical" or urgency == "high" %}
-I have received your message and will respond with the requested information as soon as possible.
-{% else %}
-I have received your message and will get back to you shortly with the requested information.
-{% endif %}
+# Separators in the local part of an address that become spaces in a name
+_NAME_TRANS = str.maketrans({'.': ' ', '_': ' '})
 
-{% if has_deadline %}
-I understand the deadline is {{ deadline }}, and I will ensure to respond in time.
-{% endif %}
 
-Best regards,
-{{ user_name }}"""),
-            
-            "internship": Template("""Hello {{ sender_name }},
-
-Thank you for reaching out regarding {{ subject }}.
-
-{% if "interview" in subject.lower() %}
-I appreciate the opportunity and am very interested in this position. I am available for an interview and will confirm my availability shortly.
-{% elif "application" in subject.lower() %}
-Thank you for considering my application. I am very interested in this opportunity and look forward to hearing from you.
-{% else %}
-I appreciate the opportunity and will respond with the requested information shortly.
-{% endif %}
+def _render_academic(sender_name, subject, urgency, has_deadline, deadline, user_name) -> str:
+    if urgency == "critical" or urgency == "high":
+        status = "I have received your message and will respond with the requested information as soon as possible."
+    else:
+        status = "I have received your message and will get back to you shortly with the requested information."
+    
+    draft = f"Dear {sender_name},\n\nThank you for your email regarding {subject}.\n\n{status}\n\n"
+    
+    if has_deadline:
+        draft += f"I understand the deadline is {deadline}, and I will ensure to respond in time.\n\n"
+    
+    return draft + f"Best regards,\n{user_name}"
 
-Kind regards,
-{{ user_name }}"""),
-            
-            "meeting": Template("""Hello {{ sender_name }},
 
-Thank you for your message about {{ subject }}.
+def _render_internship(sender_name, subject, urgency, has_deadline, deadline, user_name) -> str:
+    subject_lower = subject.lower()
+    
+    if "interview" in subject_lower:
+        body = "I appreciate the opportunity and am very interested in this position. I am available for an interview and will confirm my availability shortly."
+    elif "application" in subject_lower:
+        body = "Thank you for considering my application. I am very interested in this opportunity and look forward to hearing from you."
+    else:
+        body = "I appreciate the opportunity and will respond with the requested information shortly."
+    
+    return f"Hello {sender_name},\n\nThank you for reaching out regarding {subject}.\n\n{body}\n\nKind regards,\n{user_name}"
 
-{% if urgency == "critical" or urgency == "high" %}
-I am available at the proposed time and look forward to our meeting.
-{% else %}
-I would be happy to meet. Please let me know what times work best for you, and I will confirm my availability.
-{% endif %}
 
-Best,
-{{ user_name }}"""),
-            
-            "support": Template("""Hello,
+def _render_meeting(sender_name, subject, urgency, has_deadline, deadline, user_name) -> str:
+    if urgency == "critical" or urgency == "high":
+        body = "I am available at the proposed time and look forward to our meeting."
+    else:
+        body = "I would be happy to meet. Please let me know what times work best for you, and I will confirm my availability."
+    
+    return f"Hello {sender_name},\n\nThank you for your message about {subject}.\n\n{body}\n\nBest,\n{user_name}"
 
-Thank you for reaching out regarding {{ subject }}.
 
-I have received your request and will look into this matter. I will get back to you {% if urgency == "critical" %}as soon as possible{% elif urgency == "high" %}within 24 hours{% else %}within 2-3 business days{% endif %} with a solution.
+def _render_support(sender_name, subject, urgency, has_deadline, deadline, user_name) -> str:
+    if urgency == "critical":
+        timeframe = "as soon as possible"
+    elif urgency == "high":
+        timeframe = "within 24 hours"
+    else:
+        timeframe = "within 2-3 business days"
+    
+    return f"Hello,\n\nThank you for reaching out regarding {subject}.\n\nI have received your request and will look into this matter. I will get back to you {timeframe} with a solution.\n\nBest regards,\n{user_name}"
 
-Best regards,
-{{ user_name }}"""),
-            
-            "general": Template("""Hello {{ sender_name }},
 
-Thank you for your email regarding {{ subject }}.
+def _render_general(sender_name, subject, urgency, has_deadline, deadline, user_name) -> str:
+    return f"Hello {sender_name},\n\nThank you for your email regarding {subject}.\n\nI have received your message and will respond shortly.\n\nBest regards,\n{user_name}"
 
-I have received your message and will respond shortly.
 
-Best regards,
-{{ user_name }}"""),
+class TemplateEngine:
+    """Generate email responses using templates."""
+    
+    def __init__(self):
+        # Built-in templates for each intent, rendered as plain Python
+        self._render = {
+            "academic": _render_academic,
+            "internship": _render_internship,
+            "meeting": _render_meeting,
+            "support": _render_support,
+            "general": _render_general,
         }
+        
+        # Custom Jinja2 templates added via add_custom_template
+        self.templates = {}
     
     def generate(
         self,
@@ -100,27 +120,38 @@ Best regards,
         Returns:
             Generation result with draft text
         """
-        # Get template for intent
-        template = self.templates.get(intent, self.templates["general"])
-        
         # Extract sender name
         sender = email.get("sender", "")
         sender_name = self._extract_name(sender)
         
+        # One scan of the body yields both the flag and the deadline text
+        deadline = self._extract_deadline(email.get("body", ""))
+        
         # Prepare template variables
         context = {
             "sender_name": sender_name,
             "subject": email.get("subject", "your message"),
             "urgency": urgency,
             "user_name": user_name,
-            "has_deadline": "deadline" in email.get("body", "").lower(),
-            "deadline": self._extract_deadline(email.get("body", "")),
+            "has_deadline": bool(deadline),
+            "deadline": deadline,
             **kwargs
         }
         
         # Render template
         try:
-            draft = template.render(**context)
+            if intent in self.templates:
+                draft = self.templates[intent].render(**context)
+            else:
+                render = self._render.get(intent, _render_general)
+                draft = render(
+                    context["sender_name"],
+                    context["subject"],
+                    context["urgency"],
+                    context["has_deadline"],
+                    context["deadline"],
+                    context["user_name"]
+                )
             
             return {
                 "draft": draft.strip(),
@@ -139,6 +170,18 @@ Best regards,
                 "word_count": 15,
             }
     
+    def has_template(self, intent: str) -> bool:
+        """
+        Check whether an intent has its own (built-in or custom) template.
+        
+        Args:
+            intent: Intent name
+            
+        Returns:
+            True if the intent does not fall back to the general template
+        """
+        return intent in self.templates or intent in self._render
+    
     def _extract_name(self, email_address: str) -> str:
         """
         Extract name from email address.
@@ -154,15 +197,12 @@ Best regards,
         
         # Try to extract name from email
         # Example: john.doe@example.com -> John Doe
-        local_part = email_address.split('@')[0]
-        
-        # Replace dots and underscores with spaces
-        name = local_part.replace('.', ' ').replace('_', ' ')
+        local_part = email_address.partition('@')[0]
         
-        # Capitalize
-        name = ' '.join(word.capitalize() for word in name.split())
+        # Replace dots and underscores with spaces, collapse runs, capitalize
+        name = ' '.join(local_part.translate(_NAME_TRANS).split()).title()
         
-        return name if name else "there"
+        return name or "there"
     
     def _extract_deadline(self, text: str) -> str:
         """
@@ -174,18 +214,18 @@ Best regards,
         Returns:
             Deadline text or empty string
         """
-        import re
+        # Single pass: an explicit "deadline" wins, otherwise the first
+        # "due", otherwise the first "by"
+        found = {}
+        for match in _DEADLINE_RE.finditer(text):
+            kind = match.lastgroup
+            if kind == "deadline":
+                return match.group(kind)
+            found.setdefault(kind, match.group(kind))
         
-        patterns = [
-            r'deadline\s+(?:is\s+)?(?:on\s+)?(\w+\s+\d+)',
-            r'due\s+(?:on\s+)?(\w+\s+\d+)',
-            r'by\s+(\w+\s+\d+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1)
+        for kind in _DEADLINE_PRECEDENCE:
+            if kind in found:
+                return found[kind]
         
         return ""
     
@@ -197,6 +237,8 @@ Best regards,
             intent: Intent name
             template_str: Jinja2 template string
         """
+        from jinja2 import Template
+        
         self.templates[intent] = Template(template_str)
 
 
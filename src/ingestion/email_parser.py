@@ -6,155 +6,396 @@ Handles MIME parsing, header extraction, and body processing.
 """
 
 import re
-from typing import Dict, List, Optional, Any
+from functools import lru_cache
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
 from email import message_from_string
 from email.header import decode_header
-from bs4 import BeautifulSoup
+from email.utils import parsedate_to_datetime
+from selectolax.lexbor import LexborHTMLParser
 from datetime import datetime
 
+try:
+    from fast_mail_parser import parse_email
+except ImportError:
+    parse_email = None
+
+try:
+    # SIMD-accelerated drop-in for the stdlib decoder
+    from pybase64 import urlsafe_b64decode
+except ImportError:
+    from base64 import urlsafe_b64decode
+
+# Longest HTML body handed to the parser; larger bodies are truncated
+MAX_HTML_CHARS = 2_000_000
+
+# Elements whose content never belongs in the extracted text
+_STRIPPED_TAGS = ["script", "style", "noscript", "head", "iframe"]
+
+# Runs of 2+ spaces and every line break str.splitlines() knows split text
+# into chunks
+_TEXT_BREAK_RE = re.compile('  +|[\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]')
+
+# Headers read into the structured result (lowercase)
+_PARSED_HEADERS = frozenset({
+    "from", "to", "subject", "date", "thread-id", "message-id", "in-reply-to",
+})
+
+_ANGLE_ADDRESS_RE = re.compile(r'<(.+?)>')
+
+
+@lru_cache(maxsize=4096)
+def _parse_address_cached(address: str) -> str:
+    """Extract the address from a From/To value (memoized per header value)."""
+    # Bare addresses need no regex
+    if '<' not in address:
+        return address.strip()
+    
+    match = _ANGLE_ADDRESS_RE.search(address)
+    if match:
+        return match.group(1).strip()
+    return address.strip()
+
+
+@lru_cache(maxsize=4096)
+def _decode_header_cached(header: str) -> str:
+    """Decode an RFC 2047 header value (memoized per header value)."""
+    decoded_parts = decode_header(header)
+    result = []
+    
+    for content, encoding in decoded_parts:
+        if isinstance(content, bytes):
+            result.append(content.decode(encoding or 'utf-8', errors='ignore'))
+        else:
+            result.append(content)
+    
+    return ' '.join(result)
+
+
+class LazyEmail(Mapping):
+    """
+    Read-only parsed email whose fields are decoded on first access.
+    
+    Returned by the parser only when ``lazy=True`` is requested. Supports
+    ``email["body"]``, ``email.get(...)`` and ``{**email}``; callers that only
+    need a few fields (e.g. sender and subject for filtering) never pay for
+    body decoding, HTML conversion or attachment scanning. It is deliberately
+    not a dict, so serializers reject it instead of writing partial data;
+    use ``dict(email)`` to get a fully decoded, mutable copy. Decoding errors
+    surface on first access of the failing field.
+    """
+    
+    __slots__ = ("_loaders", "_values")
+    
+    def __init__(self, loaders: Dict[str, Callable[[], Any]]):
+        """
+        Initialize lazy email.
+        
+        Args:
+            loaders: Field name -> zero-argument function computing its value
+        """
+        self._loaders = loaders
+        self._values = {}
+    
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = self._loaders[key]()
+            return value
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._loaders)
+    
+    def __len__(self) -> int:
+        return len(self._loaders)
+    
+    def __repr__(self) -> str:
+        return f"LazyEmail({dict(self)!r})"
+
+
+def _build_email(loaders: Dict[str, Callable[[], Any]], lazy: bool):
+    """Wrap field loaders lazily, or decode every field into a plain dict."""
+    if lazy:
+        return LazyEmail(loaders)
+    return {key: load() for key, load in loaders.items()}
+
 
 class EmailParser:
     """Parse raw email messages into structured format."""
     
-    def __init__(self):
-        self.signature_patterns = [
-            r'--\s*\n',  # Standard signature delimiter
-            r'Sent from my \w+',  # Mobile signatures
-            r'Best regards,?\n',
-            r'Sincerely,?\n',
-            r'Thanks,?\n',
-        ]
+    def __init__(self, keep_raw_headers: bool = True):
+        """
+        Initialize parser.
+        
+        Args:
+            keep_raw_headers: Return every header in "raw_headers"; when False
+                only the headers the parser itself reads are kept, which
+                skips the many X-* headers of bulk and list mail
+        """
+        self.keep_raw_headers = keep_raw_headers
+        
+        self.signature_patterns = tuple(
+            re.compile(pattern)
+            for pattern in (
+                r'--\s*\n',  # Standard signature delimiter
+                r'Sent from my \w+',  # Mobile signatures
+                r'Best regards,?\n',
+                r'Sincerely,?\n',
+                r'Thanks,?\n',
+            )
+        )
     
-    def parse(self, raw_email: str, email_id: Optional[str] = None) -> Dict[str, Any]:
+    def parse(
+        self,
+        raw_email: str,
+        email_id: Optional[str] = None,
+        lazy: bool = False
+    ) -> Dict[str, Any]:
         """
         Parse raw email into structured format.
         
         Args:
             raw_email: Raw email string (MIME format)
             email_id: Optional email ID
+            lazy: Return a read-only LazyEmail that decodes fields on first
+                access instead of a fully populated dict
             
         Returns:
-            Structured email dictionary
+            Structured email dictionary (or LazyEmail if lazy)
         """
+        if parse_email is not None:
+            try:
+                return self._parse_fast(raw_email, email_id, lazy)
+            except Exception:
+                # Fall back to the stdlib parser for messages it rejects
+                pass
+        
         msg = message_from_string(raw_email)
         
-        return {
-            "id": email_id or self._generate_id(),
-            "sender": self._parse_address(msg.get("From", "")),
-            "recipient": self._parse_address(msg.get("To", "")),
-            "subject": self._decode_header(msg.get("Subject", "")),
-            "body": self._extract_body(msg),
-            "timestamp": self._parse_timestamp(msg.get("Date", "")),
-            "thread_id": msg.get("Thread-ID", ""),
-            "message_id": msg.get("Message-ID", ""),
-            "in_reply_to": msg.get("In-Reply-To", ""),
-            "labels": [],  # Will be populated by Gmail API
-            "attachments": self._extract_attachments(msg),
-            "raw_headers": dict(msg.items()),
-        }
+        # Body and attachments come from the same MIME walk
+        content = lru_cache(maxsize=None)(lambda: self._extract_body_and_attachments(msg))
+        
+        # Cheap fields are resolved now, so a missing Date falls back to the
+        # parse time rather than the time the field is first read
+        email_id = email_id or self._generate_id()
+        timestamp = self._parse_timestamp(msg.get("Date", ""))
+        
+        return _build_email({
+            "id": lambda: email_id,
+            "sender": lambda: self._parse_address(msg.get("From", "")),
+            "recipient": lambda: self._parse_address(msg.get("To", "")),
+            "subject": lambda: self._decode_header(msg.get("Subject", "")),
+            "body": lambda: content()[0],
+            "timestamp": lambda: timestamp,
+            "thread_id": lambda: msg.get("Thread-ID", ""),
+            "message_id": lambda: msg.get("Message-ID", ""),
+            "in_reply_to": lambda: msg.get("In-Reply-To", ""),
+            "labels": lambda: [],  # Will be populated by Gmail API
+            "attachments": lambda: content()[1],
+            "raw_headers": lambda: self._raw_headers(msg.items()),
+        }, lazy)
+    
+    def _parse_fast(
+        self,
+        raw_email: str,
+        email_id: Optional[str] = None,
+        lazy: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Parse raw email with the Rust-based fast-mail-parser.
+        
+        Args:
+            raw_email: Raw email string (MIME format)
+            email_id: Optional email ID
+            lazy: Return a LazyEmail instead of a fully populated dict
+            
+        Returns:
+            Structured email dictionary (same shape as parse)
+        """
+        msg = parse_email(raw_email.encode('utf-8', errors='surrogateescape'))
+        
+        # Header names are case-insensitive; values are lists per header
+        headers = {name.lower(): values[0] for name, values in msg.headers.items() if values}
+        
+        def body() -> str:
+            # Prefer plain text, fallback to HTML
+            try:
+                if msg.text_plain:
+                    return msg.text_plain[0].strip()
+                if msg.text_html:
+                    return self._html_to_text(msg.text_html[0]).strip()
+                return ""
+            except Exception:
+                # Same fallback as parse(): let the stdlib parser decode it
+                return self._extract_body_and_attachments(message_from_string(raw_email))[0]
+        
+        email_id = email_id or self._generate_id()
+        timestamp = self._parse_timestamp(headers.get("date", ""))
+        
+        return _build_email({
+            "id": lambda: email_id,
+            "sender": lambda: self._parse_address(headers.get("from", "")),
+            "recipient": lambda: self._parse_address(headers.get("to", "")),
+            "subject": lambda: msg.subject or "",
+            "body": body,
+            "timestamp": lambda: timestamp,
+            "thread_id": lambda: headers.get("thread-id", ""),
+            "message_id": lambda: headers.get("message-id", ""),
+            "in_reply_to": lambda: headers.get("in-reply-to", ""),
+            "labels": lambda: [],  # Will be populated by Gmail API
+            "attachments": lambda: [
+                {
+                    "filename": attachment.filename,
+                    "content_type": attachment.mimetype,
+                    "size": len(attachment.content),
+                }
+                for attachment in msg.attachments
+                # Inline parts (e.g. embedded images) are not attachments,
+                # matching the stdlib path
+                if attachment.filename
+                and (attachment.disposition or "").lower() == "attachment"
+            ],
+            "raw_headers": lambda: self._raw_headers(
+                (name, values[-1]) for name, values in msg.headers.items() if values
+            ),
+        }, lazy)
     
-    def parse_gmail_message(self, gmail_msg: Dict) -> Dict[str, Any]:
+    def parse_gmail_message(self, gmail_msg: Dict, lazy: bool = False) -> Dict[str, Any]:
         """
         Parse Gmail API message format.
         
         Args:
             gmail_msg: Message from Gmail API
+            lazy: Return a read-only LazyEmail that decodes fields on first
+                access instead of a fully populated dict
             
         Returns:
-            Structured email dictionary
+            Structured email dictionary (or LazyEmail if lazy)
         """
-        headers = {h["name"]: h["value"] for h in gmail_msg.get("payload", {}).get("headers", [])}
+        payload = gmail_msg.get("payload", {})
+        headers = self._raw_headers((h["name"], h["value"]) for h in payload.get("headers", []))
+        timestamp = self._parse_gmail_timestamp(gmail_msg.get("internalDate"))
         
-        return {
-            "id": gmail_msg.get("id"),
-            "sender": self._parse_address(headers.get("From", "")),
-            "recipient": self._parse_address(headers.get("To", "")),
-            "subject": headers.get("Subject", ""),
-            "body": self._extract_gmail_body(gmail_msg.get("payload", {})),
-            "timestamp": self._parse_gmail_timestamp(gmail_msg.get("internalDate")),
-            "thread_id": gmail_msg.get("threadId", ""),
-            "message_id": headers.get("Message-ID", ""),
-            "in_reply_to": headers.get("In-Reply-To", ""),
-            "labels": gmail_msg.get("labelIds", []),
-            "attachments": self._extract_gmail_attachments(gmail_msg.get("payload", {})),
-            "raw_headers": headers,
-        }
+        return _build_email({
+            "id": lambda: gmail_msg.get("id"),
+            "sender": lambda: self._parse_address(headers.get("From", "")),
+            "recipient": lambda: self._parse_address(headers.get("To", "")),
+            "subject": lambda: headers.get("Subject", ""),
+            "body": lambda: self._extract_gmail_body(payload),
+            "timestamp": lambda: timestamp,
+            "thread_id": lambda: gmail_msg.get("threadId", ""),
+            "message_id": lambda: headers.get("Message-ID", ""),
+            "in_reply_to": lambda: headers.get("In-Reply-To", ""),
+            "labels": lambda: gmail_msg.get("labelIds", []),
+            "attachments": lambda: self._extract_gmail_attachments(payload),
+            "raw_headers": lambda: headers,
+        }, lazy)
+    
+    def _raw_headers(self, items) -> Dict[str, str]:
+        """Collect (name, value) header pairs, filtered unless keep_raw_headers."""
+        if self.keep_raw_headers:
+            return dict(items)
+        return {name: value for name, value in items if name.lower() in _PARSED_HEADERS}
     
     def _parse_address(self, address: str) -> str:
         """Extract email address from 'Name <email@domain.com>' format."""
-        match = re.search(r'<(.+?)>', address)
-        if match:
-            return match.group(1).strip()
-        return address.strip()
+        return _parse_address_cached(address)
     
     def _decode_header(self, header: str) -> str:
         """Decode email header (handles encoding)."""
         if not header:
             return ""
         
-        decoded_parts = decode_header(header)
-        result = []
+        # email.header.Header values are unhashable; decode those uncached
+        if not isinstance(header, str):
+            return _decode_header_cached.__wrapped__(header)
         
-        for content, encoding in decoded_parts:
-            if isinstance(content, bytes):
-                result.append(content.decode(encoding or 'utf-8', errors='ignore'))
-            else:
-                result.append(content)
-        
-        return ' '.join(result)
+        return _decode_header_cached(header)
     
-    def _extract_body(self, msg) -> str:
-        """Extract email body (prefer plain text, fallback to HTML)."""
+    def _extract_body_and_attachments(self, msg) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Extract body (prefer plain text, fallback to HTML) and attachment
+        metadata in a single walk of the MIME tree.
+        
+        Args:
+            msg: Parsed email message
+            
+        Returns:
+            Tuple of (body text, attachment metadata list)
+        """
         body = ""
+        attachments = []
         
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                
-                if content_type == "text/plain":
-                    try:
-                        body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        break
-                    except:
-                        continue
-                elif content_type == "text/html" and not body:
-                    try:
-                        html = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        body = self._html_to_text(html)
-                    except:
-                        continue
-        else:
+        if not msg.is_multipart():
             try:
                 body = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
                 if msg.get_content_type() == "text/html":
                     body = self._html_to_text(body)
             except:
                 body = str(msg.get_payload())
+            
+            return body.strip(), attachments
         
-        return body.strip()
+        found_plain = False
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            payload = None
+            
+            if not found_plain and (
+                content_type == "text/plain"
+                or (content_type == "text/html" and not body)
+            ):
+                try:
+                    payload = part.get_payload(decode=True)
+                    text = payload.decode('utf-8', errors='ignore')
+                    if content_type == "text/plain":
+                        body = text
+                        found_plain = True
+                    else:
+                        body = self._html_to_text(text)
+                except:
+                    pass
+            
+            if part.get_content_disposition() == "attachment":
+                filename = part.get_filename()
+                if filename:
+                    if payload is None:
+                        payload = part.get_payload(decode=True)
+                    attachments.append({
+                        "filename": self._decode_header(filename),
+                        "content_type": content_type,
+                        "size": len(payload or b""),
+                    })
+        
+        return body.strip(), attachments
     
     def _extract_gmail_body(self, payload: Dict) -> str:
         """Extract body from Gmail API payload."""
-        import base64
-        
-        body = ""
-        
         if "parts" in payload:
+            # Pick the part first and decode only that one
+            plain_data = html_data = ""
             for part in payload["parts"]:
-                if part.get("mimeType") == "text/plain":
-                    data = part.get("body", {}).get("data", "")
-                    if data:
-                        body = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+                mime_type = part.get("mimeType")
+                if mime_type == "text/plain":
+                    plain_data = part.get("body", {}).get("data", "")
+                    if plain_data:
                         break
-                elif part.get("mimeType") == "text/html" and not body:
-                    data = part.get("body", {}).get("data", "")
-                    if data:
-                        html = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                        body = self._html_to_text(html)
+                elif mime_type == "text/html" and not html_data:
+                    html_data = part.get("body", {}).get("data", "")
+            
+            if plain_data:
+                body = urlsafe_b64decode(plain_data).decode('utf-8', errors='ignore')
+            elif html_data:
+                html = urlsafe_b64decode(html_data).decode('utf-8', errors='ignore')
+                body = self._html_to_text(html)
+            else:
+                body = ""
         else:
+            body = ""
             data = payload.get("body", {}).get("data", "")
             if data:
-                body = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+                body = urlsafe_b64decode(data).decode('utf-8', errors='ignore')
                 if payload.get("mimeType") == "text/html":
                     body = self._html_to_text(body)
         
@@ -162,21 +403,29 @@ class EmailParser:
     
     def _html_to_text(self, html: str) -> str:
         """Convert HTML to plain text."""
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
+        # Bound parse time on huge (possibly hostile) bodies
+        if len(html) > MAX_HTML_CHARS:
+            print(f"HTML body truncated from {len(html)} to {MAX_HTML_CHARS} characters")
+            html = html[:MAX_HTML_CHARS]
         
-        # Get text
-        text = soup.get_text()
-        
-        # Clean up whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
+        if '<' not in html and '&' not in html and '\x00' not in html:
+            # No tags, entities or NULs: the parser would return the text
+            # unchanged, so skip it (mislabelled plain-text parts)
+            text = html
+        else:
+            tree = LexborHTMLParser(html)
+            
+            # Remove script, style and other non-content elements in one
+            # native call rather than materializing a Python node per match
+            tree.strip_tags(_STRIPPED_TAGS, recursive=True)
+            
+            # Get text
+            root = tree.body or tree.root
+            text = root.text() if root else ""
         
-        return text
+        # Clean up whitespace: one chunk per line, stripped, empties dropped
+        text = _TEXT_BREAK_RE.sub('\n', text)
+        return '\n'.join(filter(None, map(str.strip, text.split('\n'))))
     
     def _parse_timestamp(self, date_str: str) -> str:
         """Parse email date header to ISO format."""
@@ -184,10 +433,9 @@ class EmailParser:
             return datetime.now().isoformat()
         
         try:
-            from email.utils import parsedate_to_datetime
-            dt = parsedate_to_datetime(date_str)
-            return dt.isoformat()
-        except:
+            return parsedate_to_datetime(date_str).isoformat()
+        except (TypeError, ValueError):
+            # Malformed Date header
             return datetime.now().isoformat()
     
     def _parse_gmail_timestamp(self, internal_date: str) -> str:
@@ -196,29 +444,11 @@ class EmailParser:
             return datetime.now().isoformat()
         
         try:
-            timestamp_ms = int(internal_date)
-            dt = datetime.fromtimestamp(timestamp_ms / 1000.0)
-            return dt.isoformat()
-        except:
+            return datetime.fromtimestamp(int(internal_date) / 1000.0).isoformat()
+        except (TypeError, ValueError, OverflowError, OSError):
+            # Non-numeric or out-of-range internalDate
             return datetime.now().isoformat()
     
-    def _extract_attachments(self, msg) -> List[Dict[str, str]]:
-        """Extract attachment metadata."""
-        attachments = []
-        
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_disposition() == "attachment":
-                    filename = part.get_filename()
-                    if filename:
-                        attachments.append({
-                            "filename": self._decode_header(filename),
-                            "content_type": part.get_content_type(),
-                            "size": len(part.get_payload(decode=True) or b""),
-                        })
-        
-        return attachments
-    
     def _extract_gmail_attachments(self, payload: Dict) -> List[Dict[str, str]]:
         """Extract attachment metadata from Gmail payload."""
         attachments = []
@@ -242,6 +472,8 @@ class EmailParser:
 
 # Example usage
 if __name__ == "__main__":
+    import json
+    
     parser = EmailParser()
     
     # Test with sample email
@@ -263,3 +495,7 @@ Professor Smith
     print(f"Sender: {parsed['sender']}")
     print(f"Subject: {parsed['subject']}")
     print(f"Body: {parsed['body'][:100]}...")
+    
+    # Parsed emails must serialize completely (drafts are stored as JSON)
+    assert json.loads(json.dumps(parsed)) == parsed
+    assert dict(parser.parse(sample_email, parsed["id"], lazy=True)) == parsed
@@ -9,31 +9,84 @@ import re
 from typing import Dict, List, Tuple, Optional
 
 
+# Whitespace / cleanup patterns
+_MULTI_NL_RE = re.compile(r'\n{3,}')
+_MULTI_SPACE_RE = re.compile(r' {2,}')
+
+# Reply / forward markers stripped from the front of subjects (lowercase)
+_SUBJECT_PREFIXES = ("re:", "fwd:", "fw:")
+
+# Quoted reply block: a quote line (">", "On ... wrote:", forwarded header),
+# every non-blank line after it, and the blank line that closes it
+_QUOTE_BLOCK_RE = re.compile(
+    r'^(?:>|(?i:On [^\n]* wrote:)$|(?:From|Sent|To|Subject):)[^\n]*\n'
+    r'(?:[^\S\n]*\S[^\n]*\n)*'
+    r'(?:[^\S\n]*\n)?',
+    re.MULTILINE
+)
+
+# Feature patterns
+_SENTENCE_RE = re.compile(r'[.!?]+')
+_DEADLINE_RE = re.compile(r'\b(deadline|due|by|before)\s+\w+\s+\d+', re.IGNORECASE)
+
+# Keyword features, matched together in a single pass over the text
+_KEYWORD_FEATURES = {
+    "has_urgent_keywords": ("urgent", "asap", "immediately", "deadline", "today", "tomorrow", "critical"),
+    "has_meeting_keywords": ("meeting", "schedule", "calendar", "available", "appointment"),
+    "has_academic_keywords": ("professor", "assignment", "exam", "grade", "course", "class", "homework"),
+    "has_job_keywords": ("interview", "position", "application", "resume", "cv", "hiring", "job"),
+    "has_spam_keywords": ("unsubscribe", "discount", "offer", "free", "winner", "prize", "click here"),
+    "has_positive_words": ("thank", "appreciate", "great", "excellent", "wonderful", "happy"),
+    "has_negative_words": ("unfortunately", "problem", "issue", "concern", "disappointed", "angry"),
+    "has_aggressive_words": ("demand", "immediately", "unacceptable", "terrible", "worst", "hate"),
+}
+
+# Keyword -> features it sets (a keyword may belong to several)
+_KEYWORD_TO_FEATURES = {}
+for _feature, _keywords in _KEYWORD_FEATURES.items():
+    for _keyword in _keywords:
+        _KEYWORD_TO_FEATURES.setdefault(_keyword, []).append(_feature)
+
+_KEYWORDS_RE = re.compile(
+    r'\b(' + '|'.join(re.escape(keyword) for keyword in _KEYWORD_TO_FEATURES) + r')\b',
+    re.IGNORECASE
+)
+
+
 class TextPreprocessor:
     """Preprocess email text for ML models."""
     
     def __init__(self):
-        # Signature patterns
-        self.signature_patterns = [
-            r'--\s*\n.*',  # Standard signature delimiter
-            r'Sent from my [\w\s]+',  # Mobile signatures
-            r'(Best regards|Sincerely|Thanks|Cheers|Regards),?\s*\n.*',
-            r'_{3,}',  # Horizontal lines
-        ]
+        # Signature patterns (compiled once; anything after a match is dropped)
+        self.signature_patterns = tuple(
+            re.compile(pattern, re.MULTILINE | re.DOTALL | re.IGNORECASE)
+            for pattern in (
+                r'--\s*\n.*',  # Standard signature delimiter
+                r'Sent from my [\w\s]+',  # Mobile signatures
+                r'(Best regards|Sincerely|Thanks|Cheers|Regards),?\s*\n.*',
+                r'_{3,}',  # Horizontal lines
+            )
+        )
         
         # Quoted reply patterns
-        self.quote_patterns = [
-            r'^>.*$',  # Lines starting with >
-            r'^On .* wrote:$',  # "On [date] [person] wrote:"
-            r'From:.*\nSent:.*\nTo:.*\nSubject:.*',  # Forwarded email headers
-        ]
+        self.quote_patterns = tuple(
+            re.compile(pattern, re.MULTILINE | re.IGNORECASE)
+            for pattern in (
+                r'^>.*$',  # Lines starting with >
+                r'^On .* wrote:$',  # "On [date] [person] wrote:"
+                r'From:.*\nSent:.*\nTo:.*\nSubject:.*',  # Forwarded email headers
+            )
+        )
         
         # Email disclaimer patterns
-        self.disclaimer_patterns = [
-            r'This email and any attachments.*confidential',
-            r'CONFIDENTIALITY NOTICE:.*',
-            r'Please consider the environment before printing',
-        ]
+        self.disclaimer_patterns = tuple(
+            re.compile(pattern, re.IGNORECASE | re.DOTALL)
+            for pattern in (
+                r'This email and any attachments.*confidential',
+                r'CONFIDENTIALITY NOTICE:.*',
+                r'Please consider the environment before printing',
+            )
+        )
     
     def preprocess(self, email: Dict[str, str]) -> Dict[str, str]:
         """
@@ -45,43 +98,57 @@ class TextPreprocessor:
         Returns:
             Preprocessed email with cleaned text
         """
-        subject = email.get("subject", "")
-        body = email.get("body", "")
-        
-        # Clean body
-        cleaned_body = self._clean_body(body)
-        
-        # Remove signature
-        cleaned_body = self._remove_signature(cleaned_body)
+        return self.preprocess_batch([email])[0]
+    
+    def preprocess_batch(self, emails: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Preprocess several emails at once (e.g. an mbox or a Gmail page).
         
-        # Remove quoted replies
-        cleaned_body = self._remove_quoted_replies(cleaned_body)
+        Each cleaning stage runs over the whole batch before the next one,
+        so the per-stage pattern tuples stay hot across emails.
         
-        # Remove disclaimers
-        cleaned_body = self._remove_disclaimers(cleaned_body)
+        Args:
+            emails: Structured email dictionaries
+            
+        Returns:
+            Preprocessed emails with cleaned text, in input order
+        """
+        bodies = [email.get("body", "") for email in emails]
         
-        # Normalize whitespace
-        cleaned_body = self._normalize_whitespace(cleaned_body)
+        # Clean body, remove signature, quoted replies and disclaimers,
+        # then normalize whitespace
+        for stage in (
+            self._clean_body,
+            self._remove_signature,
+            self._remove_quoted_replies,
+            self._remove_disclaimers,
+            self._normalize_whitespace,
+        ):
+            bodies = list(map(stage, bodies))
         
-        # Clean subject
-        cleaned_subject = self._clean_subject(subject)
+        # Clean subjects
+        subjects = list(map(self._clean_subject, (email.get("subject", "") for email in emails)))
         
-        # Combine for model input
-        combined_text = f"{cleaned_subject} {cleaned_body}".strip()
+        results = []
+        for email, cleaned_subject, cleaned_body in zip(emails, subjects, bodies):
+            # Combine for model input
+            combined_text = f"{cleaned_subject} {cleaned_body}".strip()
+            
+            results.append({
+                **email,
+                "cleaned_subject": cleaned_subject,
+                "cleaned_body": cleaned_body,
+                "combined_text": combined_text,
+                "word_count": len(combined_text.split()),
+                "char_count": len(combined_text),
+            })
         
-        return {
-            **email,
-            "cleaned_subject": cleaned_subject,
-            "cleaned_body": cleaned_body,
-            "combined_text": combined_text,
-            "word_count": len(combined_text.split()),
-            "char_count": len(combined_text),
-        }
+        return results
     
     def _clean_body(self, body: str) -> str:
         """Basic body cleaning."""
         # Remove excessive newlines
-        body = re.sub(r'\n{3,}', '\n\n', body)
+        body = _MULTI_NL_RE.sub('\n\n', body)
         
         # Remove URLs (optional - keep for now as they might be relevant)
         # body = re.sub(r'http[s]?://\S+', '[URL]', body)
@@ -95,7 +162,7 @@ class TextPreprocessor:
         """Remove email signature."""
         for pattern in self.signature_patterns:
             # Find signature and remove everything after
-            match = re.search(pattern, text, re.MULTILINE | re.DOTALL | re.IGNORECASE)
+            match = pattern.search(text)
             if match:
                 text = text[:match.start()].strip()
                 break
@@ -104,66 +171,47 @@ class TextPreprocessor:
     
     def _remove_quoted_replies(self, text: str) -> str:
         """Remove quoted replies from previous emails."""
-        lines = text.split('\n')
-        cleaned_lines = []
-        in_quote = False
-        
-        for line in lines:
-            # Check if line is a quote
-            if re.match(r'^>+\s*', line):
-                in_quote = True
-                continue
-            
-            # Check for "On ... wrote:" pattern
-            if re.match(r'^On .* wrote:$', line, re.IGNORECASE):
-                in_quote = True
-                continue
-            
-            # Check for forwarded email headers
-            if re.match(r'^(From|Sent|To|Subject):', line):
-                in_quote = True
-                continue
-            
-            # If not in quote, keep the line
-            if not in_quote:
-                cleaned_lines.append(line)
-            
-            # Reset quote flag on empty line
-            if not line.strip():
-                in_quote = False
-        
-        return '\n'.join(cleaned_lines)
+        # Terminate the last line so every line carries its own newline,
+        # drop whole quote blocks in one scan, then remove that newline again
+        return _QUOTE_BLOCK_RE.sub('', text + '\n')[:-1]
     
     def _remove_disclaimers(self, text: str) -> str:
         """Remove legal disclaimers and confidentiality notices."""
         for pattern in self.disclaimer_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.DOTALL)
+            text = pattern.sub('', text)
         
         return text.strip()
     
     def _normalize_whitespace(self, text: str) -> str:
         """Normalize whitespace."""
         # Replace multiple spaces with single space
-        text = re.sub(r' {2,}', ' ', text)
+        text = _MULTI_SPACE_RE.sub(' ', text)
         
         # Replace multiple newlines with double newline
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        text = _MULTI_NL_RE.sub('\n\n', text)
         
-        # Remove leading/trailing whitespace from each line
-        lines = [line.strip() for line in text.split('\n')]
-        text = '\n'.join(lines)
+        # Remove leading/trailing whitespace from each line (map keeps the
+        # per-line loop in C)
+        text = '\n'.join(map(str.strip, text.split('\n')))
         
         return text.strip()
     
     def _clean_subject(self, subject: str) -> str:
         """Clean email subject."""
-        # Remove "Re:", "Fwd:", etc.
-        subject = re.sub(r'^(Re|Fwd|Fw):\s*', '', subject, flags=re.IGNORECASE)
+        # Remove "Re:", "Fwd:", etc. (repeatedly, e.g. "Re: Fwd: ...")
+        subject = subject.lstrip()
+        lowered = subject.lower()
+        while True:
+            for prefix in _SUBJECT_PREFIXES:
+                if lowered.startswith(prefix):
+                    subject = subject[len(prefix):].lstrip()
+                    lowered = subject.lower()
+                    break
+            else:
+                break
         
         # Remove excessive whitespace
-        subject = re.sub(r'\s+', ' ', subject)
-        
-        return subject.strip()
+        return ' '.join(subject.split())
     
     def extract_features(self, email: Dict[str, str]) -> Dict[str, any]:
         """
@@ -178,13 +226,15 @@ class TextPreprocessor:
         text = email.get("combined_text", "")
         sender = email.get("sender", "")
         subject = email.get("subject", "")
+        subject_lower = subject.lower()
+        words = text.split()
         
         return {
             # Text features
-            "word_count": len(text.split()),
+            "word_count": len(words),
             "char_count": len(text),
-            "sentence_count": len(re.findall(r'[.!?]+', text)),
-            "avg_word_length": sum(len(word) for word in text.split()) / max(len(text.split()), 1),
+            "sentence_count": len(_SENTENCE_RE.findall(text)),
+            "avg_word_length": sum(map(len, words)) / max(len(words), 1),
             
             # Sender features
             "sender_domain": sender.split('@')[-1] if '@' in sender else "",
@@ -196,52 +246,41 @@ class TextPreprocessor:
             "subject_length": len(subject),
             "has_question_mark": '?' in subject,
             "has_exclamation": '!' in subject,
-            "is_reply": subject.lower().startswith('re:'),
-            "is_forward": subject.lower().startswith(('fwd:', 'fw:')),
+            "is_reply": subject_lower.startswith('re:'),
+            "is_forward": subject_lower.startswith(('fwd:', 'fw:')),
             
             # Urgency indicators
-            "has_urgent_keywords": bool(re.search(
-                r'\b(urgent|asap|immediately|deadline|today|tomorrow|critical)\b',
-                text.lower()
-            )),
-            "has_deadline": bool(re.search(
-                r'\b(deadline|due|by|before)\s+\w+\s+\d+',
-                text.lower()
-            )),
+            "has_deadline": bool(_DEADLINE_RE.search(text)),
             
-            # Intent indicators
-            "has_meeting_keywords": bool(re.search(
-                r'\b(meeting|schedule|calendar|available|appointment)\b',
-                text.lower()
-            )),
-            "has_academic_keywords": bool(re.search(
-                r'\b(professor|assignment|exam|grade|course|class|homework)\b',
-                text.lower()
-            )),
-            "has_job_keywords": bool(re.search(
-                r'\b(interview|position|application|resume|cv|hiring|job)\b',
-                text.lower()
-            )),
-            "has_spam_keywords": bool(re.search(
-                r'\b(unsubscribe|discount|offer|free|winner|prize|click here)\b',
-                text.lower()
-            )),
-            
-            # Sentiment indicators
-            "has_positive_words": bool(re.search(
-                r'\b(thank|appreciate|great|excellent|wonderful|happy)\b',
-                text.lower()
-            )),
-            "has_negative_words": bool(re.search(
-                r'\b(unfortunately|problem|issue|concern|disappointed|angry)\b',
-                text.lower()
-            )),
-            "has_aggressive_words": bool(re.search(
-                r'\b(demand|immediately|unacceptable|terrible|worst|hate)\b',
-                text.lower()
-            )),
+            # Keyword indicators (urgency, intent, sentiment)
+            **self._keyword_features(text),
         }
     
+    def _keyword_features(self, text: str) -> Dict[str, bool]:
+        """
+        Detect all keyword categories in one scan of the text.
+        
+        Args:
+            text: Text to scan
+            
+        Returns:
+            Flag per keyword feature
+        """
+        features = dict.fromkeys(_KEYWORD_FEATURES, False)
+        remaining = len(features)
+        
+        for match in _KEYWORDS_RE.finditer(text):
+            for feature in _KEYWORD_TO_FEATURES[match.group(1).lower()]:
+                if not features[feature]:
+                    features[feature] = True
+                    remaining -= 1
+            
+            # Stop early once every category has been seen
+            if not remaining:
+                break
+        
+        return features
+    
     def tokenize_for_bert(self, text: str, max_length: int = 512) -> Dict[str, List[int]]:
         """
         Tokenize text for BERT model (placeholder - will use transformers tokenizer).
@@ -8,6 +8,24 @@ import re
 from typing import Dict, List, Optional
 
 
+# Greeting / signature patterns
+_GREETING_RES = (
+    re.compile(r'^(dear|hello|hi|hey|greetings)', re.IGNORECASE),
+    re.compile(r'^\w+,', re.IGNORECASE),  # Name followed by comma
+)
+_SIGNATURE_RES = (
+    re.compile(r'(best regards|sincerely|thanks|cheers|regards|best)', re.IGNORECASE),
+    re.compile(r'^\w+\s*$', re.IGNORECASE),  # Just a name on last line
+)
+
+# Word tokens for the inappropriate-content check
+_WORD_RE = re.compile(r'\w+')
+
+# Auto-fix patterns
+_MULTI_SPACE_RE = re.compile(r' {2,}')
+_MULTI_NL_RE = re.compile(r'\n{3,}')
+
+
 class ResponseValidator:
     """
     Validate generated email responses.
@@ -38,6 +56,15 @@ class ResponseValidator:
             # Add more as needed
         ]
         
+        # Single words are matched as whole tokens via set intersection
+        # (so "hell" no longer flags "Hello"); multi-word phrases by substring
+        self._inappropriate_tokens = frozenset(
+            word.lower() for word in self.inappropriate_words if _WORD_RE.fullmatch(word)
+        )
+        self._inappropriate_phrases = tuple(
+            word.lower() for word in self.inappropriate_words if not _WORD_RE.fullmatch(word)
+        )
+        
         # Required elements
         self.min_word_count = 10
         self.max_word_count = 500
@@ -70,6 +97,12 @@ class ResponseValidator:
         issues = []
         warnings = []
         
+        # Computed once, shared by the checks and the result
+        word_count = len(draft.split())
+        draft_lower = draft.lower()
+        has_greeting = self._has_greeting(draft)
+        has_signature = self._has_signature(draft)
+        
         # Check confidence threshold
         min_confidence = min(generation_confidence, classification_confidence)
         threshold = self.confidence_thresholds.get(intent, 0.75)
@@ -83,7 +116,6 @@ class ResponseValidator:
             })
         
         # Check length
-        word_count = len(draft.split())
         if word_count < self.min_word_count:
             issues.append({
                 "type": "too_short",
@@ -100,7 +132,7 @@ class ResponseValidator:
             })
         
         # Check for inappropriate content
-        inappropriate_found = [word for word in self.inappropriate_words if word in draft.lower()]
+        inappropriate_found = self._find_inappropriate(draft_lower)
         if inappropriate_found:
             issues.append({
                 "type": "inappropriate_content",
@@ -110,7 +142,7 @@ class ResponseValidator:
             })
         
         # Check for greeting
-        if not self._has_greeting(draft):
+        if not has_greeting:
             warnings.append({
                 "type": "missing_greeting",
                 "severity": "low",
@@ -119,7 +151,7 @@ class ResponseValidator:
             })
         
         # Check for signature
-        if not self._has_signature(draft):
+        if not has_signature:
             warnings.append({
                 "type": "missing_signature",
                 "severity": "low",
@@ -150,34 +182,42 @@ class ResponseValidator:
             "issues": issues,
             "warnings": warnings,
             "word_count": word_count,
-            "has_greeting": self._has_greeting(draft),
-            "has_signature": self._has_signature(draft),
+            "has_greeting": has_greeting,
+            "has_signature": has_signature,
             "recommendation": "approve" if passed else "escalate"
         }
     
+    def _find_inappropriate(self, text_lower: str) -> List[str]:
+        """
+        Find inappropriate words/phrases in lowercased text.
+        
+        Args:
+            text_lower: Lowercased draft text
+            
+        Returns:
+            Matched entries, in inappropriate_words order
+        """
+        hits = self._inappropriate_tokens.intersection(_WORD_RE.findall(text_lower)).union(
+            phrase for phrase in self._inappropriate_phrases if phrase in text_lower
+        )
+        if not hits:
+            return []
+        
+        return [word for word in self.inappropriate_words if word.lower() in hits]
+    
     def _has_greeting(self, text: str) -> bool:
         """Check if text has a greeting."""
-        greetings = [
-            r'^(dear|hello|hi|hey|greetings)',
-            r'^\w+,',  # Name followed by comma
-        ]
-        
         first_line = text.split('\n')[0].lower().strip()
-        return any(re.match(pattern, first_line, re.IGNORECASE) for pattern in greetings)
+        return any(pattern.match(first_line) for pattern in _GREETING_RES)
     
     def _has_signature(self, text: str) -> bool:
         """Check if text has a signature."""
-        signatures = [
-            r'(best regards|sincerely|thanks|cheers|regards|best)',
-            r'^\w+\s*$',  # Just a name on last line
-        ]
-        
         lines = [line.strip() for line in text.split('\n') if line.strip()]
         if len(lines) < 2:
             return False
         
         last_lines = '\n'.join(lines[-3:]).lower()
-        return any(re.search(pattern, last_lines, re.IGNORECASE) for pattern in signatures)
+        return any(pattern.search(last_lines) for pattern in _SIGNATURE_RES)
     
     def _check_grammar(self, text: str) -> List[Dict[str, str]]:
         """
@@ -226,10 +266,10 @@ class ResponseValidator:
             Fixed draft
         """
         # Remove double spaces
-        draft = re.sub(r' {2,}', ' ', draft)
+        draft = _MULTI_SPACE_RE.sub(' ', draft)
         
         # Remove excessive newlines
-        draft = re.sub(r'\n{3,}', '\n\n', draft)
+        draft = _MULTI_NL_RE.sub('\n\n', draft)
         
         # Ensure ends with punctuation
         if draft and draft[-1] not in '.!?':